@@ -4,6 +4,7 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import MetaTrader5 as mt5
+from numba import njit
 import time
 from datetime import datetime
 
@@ -16,6 +17,7 @@ MT5_TIMEFRAME_MAP = {
     "1T": mt5.TIMEFRAME_M1, "5T": mt5.TIMEFRAME_M5, "15T": mt5.TIMEFRAME_M15,
     "30T": mt5.TIMEFRAME_M30, "1H": mt5.TIMEFRAME_H1, "4H": mt5.TIMEFRAME_H4,
 }
+_INTERVAL_ORDER = {k: i for i, k in enumerate(MT5_TIMEFRAME_MAP)}
 
 # --- DATA FETCHING ---
 @st.cache_data(show_spinner="⏳ กำลังเชื่อมต่อและดึงข้อมูลจาก MetaTrader 5...")
@@ -40,7 +42,8 @@ def get_data(ticker, interval_str, count):
     df = pd.DataFrame(rates)
     df.index = pd.to_datetime(df['time'], unit='s')
     df.columns = ['Time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Spread', 'Real_Volume']
-    df = df[['Open', 'High', 'Low', 'Close', 'Volume']]
+    df = df[['Open', 'High', 'Low', 'Close', 'Volume']].astype(
+        {'Open': np.float32, 'High': np.float32, 'Low': np.float32, 'Close': np.float32})
     return df, None
 
 # --- LIVE SIGNAL ---
@@ -67,40 +70,115 @@ def get_live_signal_state(ticker, current_sma_filter):
 
     return {"time": time_str, "price": latest_price, "signal": signal_state, "sma": current_sma_filter}, None
 
+# --- INDICATORS ---
+@njit(cache=True)
+def sma_running(x, w):
+    # O(n) running-sum SMA; matches rolling(w).mean(): NaN until the window holds w valid samples
+    out = np.empty_like(x)
+    s = 0.0
+    valid = 0
+    for i in range(x.size):
+        if not np.isnan(x[i]):
+            s += x[i]
+            valid += 1
+        if i >= w and not np.isnan(x[i - w]):
+            s -= x[i - w]
+            valid -= 1
+        out[i] = s / w if valid == w else np.nan
+    return out
+
+@st.cache_resource
+def sma_kernel():
+    # Streamlit re-executes this script on every rerun, which rebuilds the sma_running dispatcher.
+    # Warm it once per worker and hand back that compiled dispatcher so reruns skip the JIT/cache load.
+    sma_running(np.zeros(256), 200)
+    return sma_running
+
+sma_kernel()
+
+# --- CHART DOWNSAMPLING ---
+def lttb_downsample(ts, y, n_out):
+    # Largest-Triangle-Three-Buckets: positions of the n_out points that best keep the line's shape (y must be NaN-free)
+    n = y.size
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = ts.astype(np.int64).astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nhi = edges[i + 2] if i + 2 < edges.size else n
+        avg_x, avg_y = x[hi:nhi].mean(), y[hi:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+def bucket_ohlc(df, n_out):
+    # Merge consecutive bars so at most n_out candles are sent to the browser;
+    # each candle is labelled with the row position of its bucket's first bar
+    step = -(-len(df) // n_out)
+    pos = np.arange(len(df))
+    if step == 1:
+        return df[['Open', 'High', 'Low', 'Close']].set_axis(pos)
+    candles = df.groupby(pos // step).agg({'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last'})
+    candles.index = pos[::step]
+    return candles
+
 # --- ANALYSIS AND PLOT ---
-def analyze_and_plot(data_ltf, filter_timeframe_str):
-    htf_data = data_ltf['Close'].resample(filter_timeframe_str).last().to_frame(name='Filter_Close')
-    htf_data['Filter_Open'] = data_ltf['Open'].resample(filter_timeframe_str).first()
-    htf_data['Filter_High'] = data_ltf['High'].resample(filter_timeframe_str).max()
-    htf_data['Filter_Low'] = data_ltf['Low'].resample(filter_timeframe_str).min()
-    htf_data['Filter_SMA'] = htf_data['Filter_Close'].rolling(window=200).mean()
+@st.cache_data(show_spinner=False)
+def compute_htf(data_ltf, filter_timeframe_str):
+    htf_data = data_ltf.resample(filter_timeframe_str).agg(
+        {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last'}).rename(columns=lambda c: f'Filter_{c}')
+    htf_data['Filter_SMA'] = sma_kernel()(htf_data['Filter_Close'].to_numpy(dtype=np.float64), 200)
+    return htf_data
+
+@st.cache_data(show_spinner=False)
+def build_chart_frames(data_ltf, filter_timeframe_str, n_out):
+    htf_data = compute_htf(data_ltf, filter_timeframe_str)
+    data_ltf = pd.merge_asof(data_ltf.sort_index(), htf_data[['Filter_SMA']].sort_index().ffill(),
+                             left_index=True, right_index=True, direction='backward')
+
+    # Convert the LTF index once; LTTB and both traces' x values are slices of it
+    x_vals = data_ltf.index.to_numpy()
+    sma = data_ltf['Filter_SMA'].to_numpy()
+    candles = bucket_ohlc(data_ltf, n_out)
+    # The forward-filled SMA is NaN only during its 200-bar warm-up; skip that so every LTTB point is drawable
+    valid = np.flatnonzero(~np.isnan(sma))
+    start = valid[0] if valid.size else sma.size
+    sma_idx = start + lttb_downsample(x_vals[start:], sma[start:], n_out)
+    return x_vals[candles.index.to_numpy()], candles, x_vals[sma_idx], sma[sma_idx], sma[-1]
 
-    data_ltf['Filter_SMA'] = htf_data['Filter_SMA'].ffill()
+def analyze_and_plot(data_ltf, filter_timeframe_str):
+    candle_x, candles, sma_x, sma_y, latest_sma = build_chart_frames(data_ltf, filter_timeframe_str, st.session_state.render_points)
 
     fig = go.Figure()
-    fig.add_trace(go.Candlestick(x=data_ltf.index, open=data_ltf['Open'], high=data_ltf['High'],
-                                  low=data_ltf['Low'], close=data_ltf['Close'],
+    fig.add_trace(go.Candlestick(x=candle_x, open=candles['Open'].to_numpy(), high=candles['High'].to_numpy(),
+                                  low=candles['Low'].to_numpy(), close=candles['Close'].to_numpy(),
                                   name=f'LTF Price ({st.session_state.ltf})',
                                   increasing_line_color='#00CC00', decreasing_line_color='#FF0000'))
-    fig.add_trace(go.Scatter(x=data_ltf.index, y=data_ltf['Filter_SMA'],
-                             line=dict(color='yellow', width=2),
-                             name=f'HTF Filter (200 SMA on {st.session_state.htf})'))
+    fig.add_trace(go.Scattergl(x=sma_x, y=sma_y,
+                               line=dict(color='yellow', width=2),
+                               name=f'HTF Filter (200 SMA on {st.session_state.htf})'))
     fig.update_layout(title=f"Candlestick Chart: {st.session_state.ticker} | LTF: {st.session_state.ltf}",
                       xaxis_rangeslider_visible=False, height=650,
                       legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
     st.plotly_chart(fig, use_container_width=True)
-    return data_ltf['Filter_SMA'].iloc[-1]
+    return latest_sma
 
 # --- STREAMLIT UI ---
 st.sidebar.header("⚙️ Settings & Parameters")
 ticker = st.sidebar.text_input("Ticker Symbol", "EURUSD", key="ticker").upper()
 bars_count = st.sidebar.number_input("จำนวนแท่งเทียน LTF (200-10000)", min_value=200, max_value=10000, value=5000, step=100, key="bars_count")
 ltf_options = list(MT5_TIMEFRAME_MAP.keys())
-ltf = st.sidebar.selectbox("Execution Timeframe (LTF)", ltf_options, index=ltf_options.index("5T"), key="ltf")
-ltf_index = ltf_options.index(ltf)
+ltf = st.sidebar.selectbox("Execution Timeframe (LTF)", ltf_options, index=_INTERVAL_ORDER["5T"], key="ltf")
+ltf_index = _INTERVAL_ORDER[ltf]
 htf_options_filtered = ltf_options[ltf_index:]
-default_htf_index = htf_options_filtered.index("30T") if "30T" in htf_options_filtered else 0
+default_htf_index = max(_INTERVAL_ORDER["30T"] - ltf_index, 0)
 htf = st.sidebar.selectbox("Filter Timeframe (HTF)", htf_options_filtered, index=default_htf_index, key="htf")
+render_points = st.sidebar.slider("Render density (max points per trace)", min_value=500, max_value=10000, value=3000, step=500, key="render_points")
 
 st.sidebar.markdown("---")
 if st.sidebar.button("▶️ RUN MTF ANALYSIS"):
@@ -116,7 +194,7 @@ if st.session_state.get('run_analysis', False):
             st.warning(f"⚠️ ข้อมูลมีเพียง {data_ltf.shape[0]} แถว อาจทำให้ SMA ไม่แม่น")
         try:
             latest_sma = analyze_and_plot(data_ltf, htf)
-        except Exception as plot_e:
+        except (ValueError, KeyError) as plot_e:
             st.error(f"❌ เกิดข้อผิดพลาด: {plot_e}")
             latest_sma = None
 
@@ -156,7 +234,8 @@ if st.session_state.get('run_analysis', False):
                 st.warning("⚠️ ไม่สามารถแสดง Live Signal ได้ เนื่องจากไม่สามารถคำนวณ Filter SMA ได้")
         with tab_raw:
             st.subheader(f"Raw Data (LTF: {ltf})")
-            st.dataframe(data_ltf.tail(200), use_container_width=True)
+            if st.checkbox("Show raw data (debug)", value=False, key="show_raw"):
+                st.dataframe(data_ltf.tail(200), use_container_width=True, height=300)
 '''
 
 with open('mtf_trading_analyzer_fixed.py', 'w') as f: